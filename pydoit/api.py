@@ -6,11 +6,96 @@
 Wrapper around the i-doit JSON RPC API
 '''
 
+import collections
+import threading
+import time
+
+import orjson
 import requests
-import pprint
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+def _build_auth_headers(session_id, username, password):
+    """Build the auth headers for the given credentials
+
+    Args:
+        session_id (str): Session id, preferred over username and password
+        username (str): Username
+        password (str): Password
+
+    Returns:
+        dict: Auth headers, empty if no credentials are set
+    """
+    headers = {}
+
+    if session_id: # add the session if exists
+        headers["X-RPC-Auth-Session"] = session_id
+    elif username and password: # use http basic auth if no session exists
+        headers["X-RPC-Auth-Username"] = username
+        headers["X-RPC-Auth-Password"] = password
+
+    # if none of the above is added the api call will happen without authentification
+    return headers
+
+_BODY_SKELETON = {
+    "version": "2.0",
+    "method": None,
+    "params": None,
+    "id": None
+}
+
+def _build_body(method, req_id, params, api_key):
+    """Build the JSON RPC request body
+
+    Args:
+        method (str): RPC method
+        req_id (int): Request id to identify req/res
+        params (dict): RPC params, the apikey is added in place so the dict must be owned by the call
+        api_key (str): API Key
+
+    Returns:
+        dict: Request body
+    """
+    params["apikey"] = api_key
+    body = _BODY_SKELETON.copy()
+    body["method"] = method
+    body["params"] = params
+    body["id"] = req_id
+    return body
+
+def _unwrap(payload):
+    """Extract the result from a decoded JSON RPC response
+
+    Args:
+        payload (dict): Decoded response
+
+    Raises:
+        IdoitRequestError: Raised if the response contains an error
+
+    Returns:
+        dict: RPC result
+    """
+    if "result" in payload:
+        return payload["result"]
+    elif "error" in payload:
+        error = payload["error"]
+        raise IdoitRequestError(error["code"], error["message"], error.get("data")) # data is optional
+
 
 class Idoit:
-    def __init__(self, url, api_key, username=None, password=None):
+    # read only methods whose results are cached
+    _READONLY = {"idoit.version", "idoit.constants", "idoit.search", "cmdb.object.read"}
+    # methods changing objects, invalidate cached cmdb.object.read results
+    _INVALIDATING = {
+        "cmdb.object.create",
+        "cmdb.object.update",
+        "cmdb.object.delete",
+        "cmdb.object.archive",
+        "cmdb.object.purge",
+        "cmdb.object.recycle"
+    }
+
+    def __init__(self, url, api_key, username=None, password=None, cache_size=1024, cache_ttl=60, pool_maxsize=32, retries=3):
         """
 
         Args:
@@ -18,6 +103,10 @@ class Idoit:
             key (str): API Key
             username (str, optional): Username. Defaults to None.
             password (str, optional): Password. Defaults to None.
+            cache_size (int, optional): Max number of cached read only results, 0 disables the cache. Defaults to 1024.
+            cache_ttl (int, optional): Seconds a cached result stays valid. Defaults to 60.
+            pool_maxsize (int, optional): Max number of pooled connections, should be at least the number of threads using the client. Defaults to 32.
+            retries (int, optional): Retries on connection errors, read only methods are also retried on read errors and 502, 503, 504 responses. Defaults to 3.
         """
         self.url = url
         self.api_key = api_key
@@ -26,55 +115,222 @@ class Idoit:
 
         self.session_id = None
 
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = collections.OrderedDict() # lru: least recently used first
+        self._cache_lock = threading.Lock() # the client may be shared between threads
+        self._cache_generation = 0 # bumped on invalidation, reads started before it must not store their result
+
+        # persistent sessions for keep-alive and tls session reuse, one per retry policy
+        self._base_headers = {
+            "Content-Type": "application/json"
+        }
+        self._session = self._make_session(pool_maxsize, Retry(
+            total=retries,
+            backoff_factor=0.25,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False # hand the last response to _send so it raises IdoitRequestError
+        ))
+        # writes are not idempotent: a 502/504 or a read timeout may mean the server already ran the call,
+        # so they are only retried if the connection could not be established
+        self._write_session = self._make_session(pool_maxsize, Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            other=0,
+            raise_on_status=False
+        ))
+
+    def _make_session(self, pool_maxsize, retry):
+        session = requests.Session()
+        session.headers.update(self._base_headers)
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the underlying HTTP sessions and their pooled connections"""
+        self._session.close()
+        self._write_session.close()
+
+    def set_auth(self, username, password):
+        """Set the credentials used for http basic auth and login
 
-    def _req(self, method, req_id, **params):
+        Args:
+            username (str): Username
+            password (str): Password
+        """
+        self.username = username
+        self.password = password
+        self.clear_cache() # cached results may depend on the user
+
+    def clear_cache(self):
+        """Drop all cached results"""
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_generation += 1
+
+    def _invalidate_object_reads(self):
+        with self._cache_lock:
+            for key in [key for key in self._cache if key[0].startswith("cmdb.object.read")]:
+                del self._cache[key]
+            self._cache_generation += 1
+
+    def _req(self, method, params, req_id=1, batch=None):
         """Make a request to the API
 
         Args:
             method (str): RPC method
+            params (dict): RPC params, owned by the call since the apikey is added in place
             req_id (int, optional): Request id to identify req/res. Defaults to 1.
-            headers (dict, optional): Overrides the headers. Defaults to None.
+            batch (list, optional): If given, the call is appended to this list instead of being sent. Defaults to None.
 
         Raises:
             IdoitRequestError: Raised if an request error happens
-            IdoitError: Unknown Error
 
         Returns:
             dict: RPC result
         """
 
-        headers = {
-            "Content-Type": "application/json"
-        }
+        if batch is not None:
+            batch.append((method, params))
+            return None
+
+        cache_key = None
+        if self.cache_size and method in self._READONLY:
+            # results depend on the authenticated user, which can be changed by assigning the attributes
+            cache_key = (method, self.session_id, self.username, tuple(sorted(params.items())))
+            with self._cache_lock:
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    ts, encoded = cached
+                    if time.monotonic() - ts < self.cache_ttl:
+                        self._cache.move_to_end(cache_key)
+                        return orjson.loads(encoded) # a fresh object per hit, callers may mutate it
+                    del self._cache[cache_key]
+                generation = self._cache_generation
+        elif method in self._INVALIDATING:
+            # invalidate once the write is done (or failed, it may still have been applied),
+            # the generation bump keeps reads that overlapped the write from storing the old result
+            try:
+                return self._send(method, req_id, params)
+            finally:
+                self._invalidate_object_reads()
+
+        result = self._send(method, req_id, params)
+
+        if cache_key is not None:
+            encoded = orjson.dumps(result) # cached encoded, decoding is much cheaper than a deepcopy
+            with self._cache_lock:
+                if generation == self._cache_generation:
+                    self._cache[cache_key] = (time.monotonic(), encoded)
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+        return result
+
+    def _send(self, method, req_id, params):
+        """Send a single request to the API, bypassing the cache
+
+        Args:
+            method (str): RPC method
+            req_id (int): Request id to identify req/res
+            params (dict): RPC params
 
-        if self.session_id: # add the session if exists
-            headers["X-RPC-Auth-Session"] = self.session_id
-        elif self.username and self.password: # use http basic auth if no session exists
-            headers["X-RPC-Auth-Username"] = self.username
-            headers["X-RPC-Auth-Password"] = self.password
+        Raises:
+            IdoitRequestError: Raised if an request error happens, code is the HTTP status for non 200 responses
 
-        # if none of the above is added the api call will happen without authentification
+        Returns:
+            dict: RPC result
+        """
+        body = _build_body(method, req_id, params, self.api_key)
+        headers = _build_auth_headers(self.session_id, self.username, self.password)
 
-        body = {
-            "version": "2.0",
-            "method": method,
-            "params": {
-                **params,
-                "apikey": self.api_key
-            },
-            "id": req_id
-        }
+        session = self._session if method in self._READONLY else self._write_session
 
-        response = requests.post(self.url, headers=headers, json=body)
+        response = session.post(self.url, headers=headers, data=orjson.dumps(body))
 
         if response.status_code == 200:
-            if "result" in response.json():
-                return response.json()["result"]
-            elif "error" in response.json():
-                error = response.json()["error"]
-                raise IdoitRequestError(error["code"], error["message"], error["data"])
+            return _unwrap(orjson.loads(response.content))
         else:
-            raise IdoitRequestError("-1", "Unknown Error", None)
+            raise IdoitRequestError(response.status_code, response.reason, None)
+
+    def req_batch(self, calls):
+        """Send multiple calls as one JSON RPC batch request
+
+        Args:
+            calls (list): List of (method, params) tuples
+
+        Raises:
+            IdoitRequestError: Raised if an request error happens in any of the calls
+
+        Returns:
+            list: RPC results in the same order as the calls
+        """
+        if not calls:
+            return []
+
+        if any(method in self._INVALIDATING for method, _ in calls):
+            try:
+                return self._send_batch(calls)
+            finally:
+                self._invalidate_object_reads()
+
+        return self._send_batch(calls)
+
+    def _send_batch(self, calls):
+        """Send a batch request to the API, bypassing the cache
+
+        Args:
+            calls (list): List of (method, params) tuples
+
+        Returns:
+            list: RPC results in the same order as the calls
+        """
+        body = [_build_body(method, i, dict(params), self.api_key) for i, (method, params) in enumerate(calls)]
+        headers = _build_auth_headers(self.session_id, self.username, self.password)
+
+        session = self._session if all(method in self._READONLY for method, _ in calls) else self._write_session
+
+        response = session.post(self.url, headers=headers, data=orjson.dumps(body))
+
+        if response.status_code == 200:
+            payload = orjson.loads(response.content)
+            if isinstance(payload, dict): # invalid batch or parse error: a single error object with id null
+                _unwrap(payload)
+                raise IdoitRequestError("-1", "Unexpected batch response", payload)
+            by_id = {res.get("id"): res for res in payload}
+            results = []
+            for i in range(len(calls)):
+                if i not in by_id:
+                    raise IdoitRequestError("-1", f"Missing response for batch call {i}", None)
+                results.append(_unwrap(by_id[i]))
+            return results
+        else:
+            raise IdoitRequestError(response.status_code, response.reason, None)
+
+    def batch(self):
+        """Collect calls and send them as one batch request
+
+        Example:
+            with idoit.batch() as b:
+                b.object_read(1)
+                b.object_read(2)
+                results = b.send()
+
+        Returns:
+            IdoitBatch: Batch collecting the calls
+        """
+        return IdoitBatch(self)
 
 
     # -----------------------
@@ -89,9 +345,10 @@ class Idoit:
         """
 
         if self.username and self.password:
-            if self.session_id == None:
-                result = self._req("idoit.login", req_id=req_id)
+            if self.session_id is None:
+                result = self._req("idoit.login", {}, req_id=req_id)
                 self.session_id = result["session-id"]
+                self.clear_cache() # cached results may depend on the user
             else:
                 raise IdoitAlreadyLoggedInError
         else:
@@ -105,44 +362,48 @@ class Idoit:
                 req_id (int, optional): Request identifier. Defaults to 1.
 
         """
-        self._req("idoit.logout", req_id=req_id)
+        self._req("idoit.logout", {}, req_id=req_id)
         self.session_id = None
+        self.clear_cache()
 
-    def version(self, req_id=1):
+    def version(self, req_id=1, batch=None):
         """Fetch information about i-doit and the current user
 
         Args:
             req_id (int, optional): Request identifier. Defaults to 1.
+            batch (list, optional): Collect the call in this list instead of sending it. Defaults to None.
 
         Returns:
             dict: Dictionary containing information
         """
-        res = self._req("idoit.version", req_id=req_id)
+        res = self._req("idoit.version", {}, req_id=req_id, batch=batch)
         return res
 
-    def search(self, q, req_id=1):
+    def search(self, q, req_id=1, batch=None):
         """Search in i-doit
 
         Args:
             q (str): Query string
             req_id (int, optional): Request identifier. Defaults to 1.
+            batch (list, optional): Collect the call in this list instead of sending it. Defaults to None.
 
         Returns:
             list: List containig search results
         """
-        res = self._req("idoit.search", q=q, req_id=req_id)
+        res = self._req("idoit.search", {"q": q}, req_id=req_id, batch=batch)
         return res
 
-    def constants(self, req_id=1):
+    def constants(self, req_id=1, batch=None):
         """Fetch defined constants from i-doit
 
         Args:
             req_id (int, optional): Request identifier. Defaults to 1.
+            batch (list, optional): Collect the call in this list instead of sending it. Defaults to None.
 
         Returns:
             dict: Dictionary containing all constants
         """
-        res = self._req("idoit.constants", req_id=req_id)
+        res = self._req("idoit.constants", {}, req_id=req_id, batch=batch)
         return res
 
     # ----------------------
@@ -165,55 +426,60 @@ class Idoit:
         """
         res = self._req(
             "cmdb.object.create",
-            type=obj_type,
-            title=title,
-            category=category,
-            purpose=purpose,
-            cmdb_status=cmdb_status,
-            description=description,
+            {
+                "type": obj_type,
+                "title": title,
+                "category": category,
+                "purpose": purpose,
+                "cmdb_status": cmdb_status,
+                "description": description
+            },
             req_id=req_id
         )
         return res
 
-    def object_read(self, obj_id, req_id=1):
+    def object_read(self, obj_id, req_id=1, batch=None):
         """Read common information about an object
 
         Args:
             obj_id (int): Object identifier as integer
             req_id (int, optional): Request identifier. Defaults to 1.
+            batch (list, optional): Collect the call in this list instead of sending it. Defaults to None.
 
         Returns:
             dict: Dict with information
         """
-        res = self._req("cmdb.object.read", id=obj_id, req_id=req_id)
+        res = self._req("cmdb.object.read", {"id": obj_id}, req_id=req_id, batch=batch)
         return res
 
-    def object_update(self, obj_id, title, req_id=1):
+    def object_update(self, obj_id, title, req_id=1, batch=None):
         """Update an object
 
         Args:
             obj_id (int): Object identifier as integer
             title (str): New title
             req_id (int, optional): Request identifier. Defaults to 1.
+            batch (list, optional): Collect the call in this list instead of sending it. Defaults to None.
 
         Returns:
             dict: Result as dict
         """
-        res = self._req("cmdb.object.update", id=obj_id, title=title, req_id=req_id)
+        res = self._req("cmdb.object.update", {"id": obj_id, "title": title}, req_id=req_id, batch=batch)
         return res
 
-    def object_delete(self, obj_id, status, req_id=1):
+    def object_delete(self, obj_id, status, req_id=1, batch=None):
         """Delete an object
 
         Args:
             obj_id (int): Object identifier as integer
             status (str): Status constant: C__RECORD_STATUS__ARCHIVED, C__RECORD_STATUS__DELETED, C__RECORD_STATUS__PURGE
             req_id (int, optional): Request identifier. Defaults to 1.
+            batch (list, optional): Collect the call in this list instead of sending it. Defaults to None.
 
         Returns:
             dict: Result dict
         """
-        res = self._req("cmdb.object.delete", id=obj_id, status=status, req_id=req_id)
+        res = self._req("cmdb.object.delete", {"id": obj_id, "status": status}, req_id=req_id, batch=batch)
         return res
 
     def object_recycle(self, obj_id, req_id=1):
@@ -226,7 +492,7 @@ class Idoit:
         Returns:
             dict: Result dict
         """
-        res = self._req("cmdb.object.recycle", object=obj_id, req_id=req_id)
+        res = self._req("cmdb.object.recycle", {"object": obj_id}, req_id=req_id)
         return res
 
     def object_archive(self, obj_id, req_id=1):
@@ -239,7 +505,7 @@ class Idoit:
         Returns:
             dict: Result dict
         """
-        res = self._req("cmdb.object.archive", object=obj_id, req_id=req_id)
+        res = self._req("cmdb.object.archive", {"object": obj_id}, req_id=req_id)
         return res
 
     def object_purge(self, obj_id, req_id=1):
@@ -252,7 +518,7 @@ class Idoit:
         Returns:
             dict: Result dict
         """
-        res = self._req("cmdb.object.purge", object=obj_id, req_id=req_id)
+        res = self._req("cmdb.object.purge", {"object": obj_id}, req_id=req_id)
         return res
 
     def object_mark_as_template(self, obj_id, req_id=1):
@@ -265,7 +531,7 @@ class Idoit:
         Returns:
             dict: REsult dict
         """
-        res = self._req("cmdb.object.markAsTemplate", object=obj_id, req_id=req_id)
+        res = self._req("cmdb.object.markAsTemplate", {"object": obj_id}, req_id=req_id)
         return res
 
     def object_mark_as_mass_change_template(self, obj_id, req_id=1):
@@ -278,10 +544,60 @@ class Idoit:
         Returns:
             [type]: [description]
         """
-        res = self._req("cmdb.object.markAdMassChangeTemplate", id=obj_id, req_id=req_id)
+        res = self._req("cmdb.object.markAdMassChangeTemplate", {"id": obj_id}, req_id=req_id)
         return res
 
 
+class IdoitBatch:
+    def __init__(self, idoit):
+        """Collects calls to send them as one JSON RPC batch request
+
+        Args:
+            idoit (Idoit): Client used to send the batch
+        """
+        self.idoit = idoit
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def send(self):
+        """Send all collected calls in one request
+
+        Returns:
+            list: RPC results in the same order as the calls
+        """
+        calls, self.calls = self.calls, []
+        return self.idoit.req_batch(calls)
+
+    def version(self):
+        """Queue idoit.version"""
+        self.idoit.version(batch=self.calls)
+
+    def search(self, q):
+        """Queue idoit.search"""
+        self.idoit.search(q, batch=self.calls)
+
+    def constants(self):
+        """Queue idoit.constants"""
+        self.idoit.constants(batch=self.calls)
+
+    def object_read(self, obj_id):
+        """Queue cmdb.object.read"""
+        self.idoit.object_read(obj_id, batch=self.calls)
+
+    def object_update(self, obj_id, title):
+        """Queue cmdb.object.update"""
+        self.idoit.object_update(obj_id, title, batch=self.calls)
+
+    def object_delete(self, obj_id, status):
+        """Queue cmdb.object.delete"""
+        self.idoit.object_delete(obj_id, status, batch=self.calls)
+
+
 # --- Exceptions ---
 class IdoitError(Exception):
     """Base idoit error"""
@@ -298,8 +614,8 @@ class IdoitAlreadyLoggedInError(IdoitError):
 
 class IdoitRequestError(IdoitError):
     def __init__(self, code, msg, data):
-        self.code = code,
-        self.msg = msg,
+        self.code = code
+        self.msg = msg
         self.data = data
 
     def __str__(self):
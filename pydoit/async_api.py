@@ -0,0 +1,192 @@
+'''
+Async wrapper around the i-doit JSON RPC API
+
+Requires aiohttp: pip install pydoit[async]
+'''
+
+import asyncio
+
+import aiohttp
+import orjson
+
+from .api import (
+    _build_auth_headers,
+    _build_body,
+    _unwrap,
+    IdoitAlreadyLoggedInError,
+    IdoitMissingCredentialsError,
+    IdoitRequestError
+)
+
+class AsyncIdoit:
+    def __init__(self, url, api_key, username=None, password=None, max_tasks=100):
+        """
+
+        Args:
+            url (str): URL to API Endpoint
+            key (str): API Key
+            username (str, optional): Username. Defaults to None.
+            password (str, optional): Password. Defaults to None.
+            max_tasks (int, optional): Maximum number of concurrent requests in gather, also the connection pool limit. Defaults to 100.
+        """
+        self.url = url
+        self.api_key = api_key
+        self.username = username
+        self.password = password
+        self.max_tasks = max_tasks
+
+        self.session_id = None
+
+        self._session = None # created lazily, aiohttp sessions have to be created inside the event loop
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Close the underlying HTTP session and its pooled connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"Content-Type": "application/json"},
+                connector=aiohttp.TCPConnector(limit=self.max_tasks, ttl_dns_cache=300, keepalive_timeout=75)
+            )
+        return self._session
+
+    async def _req(self, method, params, req_id=1):
+        """Make a request to the API
+
+        Args:
+            method (str): RPC method
+            params (dict): RPC params, owned by the call since the apikey is added in place
+            req_id (int, optional): Request id to identify req/res. Defaults to 1.
+
+        Raises:
+            IdoitRequestError: Raised if an request error happens
+
+        Returns:
+            dict: RPC result
+        """
+        body = _build_body(method, req_id, params, self.api_key)
+
+        headers = _build_auth_headers(self.session_id, self.username, self.password)
+
+        async with self._get_session().post(self.url, headers=headers, data=orjson.dumps(body)) as response:
+            if response.status == 200:
+                return _unwrap(orjson.loads(await response.read()))
+            else:
+                raise IdoitRequestError(response.status, response.reason, None)
+
+    async def gather(self, calls):
+        """Send multiple independent calls concurrently
+
+        Args:
+            calls (list): List of (method, params) tuples
+
+        Returns:
+            list: RPC results in the same order as the calls
+        """
+        semaphore = asyncio.Semaphore(self.max_tasks)
+
+        async def run(req_id, method, params):
+            async with semaphore:
+                return await self._req(method, dict(params), req_id=req_id)
+
+        return await asyncio.gather(*[run(i, method, params) for i, (method, params) in enumerate(calls)])
+
+    # -----------------------
+    # --- NAMESPACE IDOIT ---
+    # -----------------------
+    # special method
+    async def login(self, req_id=1):
+        """Login and create a session_id for further API calls
+
+            Args:
+                req_id (int, optional): Request identifier. Defaults to 1.
+        """
+        if self.username and self.password:
+            if self.session_id is None:
+                result = await self._req("idoit.login", {}, req_id=req_id)
+                self.session_id = result["session-id"]
+            else:
+                raise IdoitAlreadyLoggedInError
+        else:
+            raise IdoitMissingCredentialsError
+
+    # special method
+    async def logout(self, req_id=1):
+        """Logout of current session
+
+            Args:
+                req_id (int, optional): Request identifier. Defaults to 1.
+        """
+        await self._req("idoit.logout", {}, req_id=req_id)
+        self.session_id = None
+
+    async def version(self, req_id=1):
+        """Fetch information about i-doit and the current user, see Idoit.version"""
+        return await self._req("idoit.version", {}, req_id=req_id)
+
+    async def search(self, q, req_id=1):
+        """Search in i-doit, see Idoit.search"""
+        return await self._req("idoit.search", {"q": q}, req_id=req_id)
+
+    async def constants(self, req_id=1):
+        """Fetch defined constants from i-doit, see Idoit.constants"""
+        return await self._req("idoit.constants", {}, req_id=req_id)
+
+    # ----------------------
+    # --- NAMESPACE CMDB ---
+    # ----------------------
+    async def object_create(self, obj_type, title, category=None, purpose=None, cmdb_status=None, description=None, req_id=1):
+        """Create new object with some optional information, see Idoit.object_create"""
+        return await self._req(
+            "cmdb.object.create",
+            {
+                "type": obj_type,
+                "title": title,
+                "category": category,
+                "purpose": purpose,
+                "cmdb_status": cmdb_status,
+                "description": description
+            },
+            req_id=req_id
+        )
+
+    async def object_read(self, obj_id, req_id=1):
+        """Read common information about an object, see Idoit.object_read"""
+        return await self._req("cmdb.object.read", {"id": obj_id}, req_id=req_id)
+
+    async def object_update(self, obj_id, title, req_id=1):
+        """Update an object, see Idoit.object_update"""
+        return await self._req("cmdb.object.update", {"id": obj_id, "title": title}, req_id=req_id)
+
+    async def object_delete(self, obj_id, status, req_id=1):
+        """Delete an object, see Idoit.object_delete"""
+        return await self._req("cmdb.object.delete", {"id": obj_id, "status": status}, req_id=req_id)
+
+    async def object_recycle(self, obj_id, req_id=1):
+        """Recycles an object, see Idoit.object_recycle"""
+        return await self._req("cmdb.object.recycle", {"object": obj_id}, req_id=req_id)
+
+    async def object_archive(self, obj_id, req_id=1):
+        """Archives an object, see Idoit.object_archive"""
+        return await self._req("cmdb.object.archive", {"object": obj_id}, req_id=req_id)
+
+    async def object_purge(self, obj_id, req_id=1):
+        """Purges an object, see Idoit.object_purge"""
+        return await self._req("cmdb.object.purge", {"object": obj_id}, req_id=req_id)
+
+    async def object_mark_as_template(self, obj_id, req_id=1):
+        """Set the Object condition as a Template, see Idoit.object_mark_as_template"""
+        return await self._req("cmdb.object.markAsTemplate", {"object": obj_id}, req_id=req_id)
+
+    async def object_mark_as_mass_change_template(self, obj_id, req_id=1):
+        """Set the Object condition as a Mass Change Template, see Idoit.object_mark_as_mass_change_template"""
+        return await self._req("cmdb.object.markAdMassChangeTemplate", {"id": obj_id}, req_id=req_id)
@@ -18,6 +18,10 @@ setup(
   download_url = 'https://github.com/aaronlyy/pydoit/archive/v0.0.4.tar.gz',
   keywords = ['api', 'wrapper', 'json', 'jsonrpc', 'http'],
   install_requires=[
-        "requests"
+        "requests",
+        "orjson"
       ],
+  extras_require={
+        "async": ["aiohttp"]
+      },
 )
\ No newline at end of file
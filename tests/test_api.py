@@ -0,0 +1,185 @@
+import http.server
+import threading
+from unittest import mock
+
+import orjson
+import pytest
+
+from pydoit.api import Idoit, IdoitRequestError
+
+
+def _response(payload, status_code=200, reason="OK"):
+    response = mock.MagicMock()
+    response.status_code = status_code
+    response.reason = reason
+    response.content = orjson.dumps(payload)
+    return response
+
+
+@pytest.fixture
+def client():
+    c = Idoit("http://idoit.test/src/jsonrpc.php", "key")
+    c._session.post = c._write_session.post = mock.MagicMock()
+    return c
+
+
+def test_req_batch_demuxes_by_id(client):
+    client._session.post.return_value = _response([
+        {"jsonrpc": "2.0", "result": "b", "id": 1},
+        {"jsonrpc": "2.0", "result": "a", "id": 0}
+    ])
+    assert client.req_batch([("cmdb.object.read", {"id": 1}), ("cmdb.object.read", {"id": 2})]) == ["a", "b"]
+    assert client._session.post.call_count == 1
+
+
+def test_req_batch_single_error_object(client):
+    client._session.post.return_value = _response(
+        {"jsonrpc": "2.0", "error": {"code": -32600, "message": "Invalid Request"}, "id": None}
+    )
+    with pytest.raises(IdoitRequestError):
+        client.req_batch([("cmdb.object.read", {"id": 1})])
+
+
+def test_req_batch_missing_id(client):
+    client._session.post.return_value = _response([
+        {"jsonrpc": "2.0", "result": "a", "id": 0},
+        {"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse error"}, "id": None}
+    ])
+    with pytest.raises(IdoitRequestError):
+        client.req_batch([("cmdb.object.read", {"id": 1}), ("cmdb.object.read", {"id": 2})])
+
+
+def test_batch_context(client):
+    client._session.post.return_value = _response([{"jsonrpc": "2.0", "result": {"id": 1}, "id": 0}])
+    with client.batch() as b:
+        b.object_read(1)
+        assert b.send() == [{"id": 1}]
+    body = orjson.loads(client._session.post.call_args.kwargs["data"])
+    assert body == [{"version": "2.0", "method": "cmdb.object.read", "params": {"id": 1, "apikey": "key"}, "id": 0}]
+
+
+def test_cache_hit_skips_request(client):
+    client._session.post.return_value = _response({"jsonrpc": "2.0", "result": {"id": 1}, "id": 1})
+    assert client.object_read(1) == {"id": 1}
+    assert client.object_read(1) == {"id": 1}
+    assert client._session.post.call_count == 1
+
+
+def test_cache_returns_copies(client):
+    client._session.post.return_value = _response({"jsonrpc": "2.0", "result": {"p": {"id": 1}}, "id": 1})
+    client.object_read(1)["p"]["id"] = 999
+    hit = client.object_read(1)
+    hit["p"]["id"] = 998
+    assert client.object_read(1) == {"p": {"id": 1}}
+
+
+def test_cache_invalidated_by_write(client):
+    client._session.post.return_value = _response({"jsonrpc": "2.0", "result": {"id": 1}, "id": 1})
+    client.object_read(1)
+    client.object_update(1, "new title")
+    client.object_read(1)
+    assert client._session.post.call_count == 3
+
+
+def test_credentials_set_after_init_are_sent(client):
+    client._session.post.return_value = _response({"jsonrpc": "2.0", "result": {"session-id": "s1"}, "id": 1})
+    client.username = "u2"
+    client.password = "p2"
+    client.login()
+    headers = client._session.post.call_args.kwargs["headers"]
+    assert headers == {"X-RPC-Auth-Username": "u2", "X-RPC-Auth-Password": "p2"}
+
+    client.version()
+    assert client._session.post.call_args.kwargs["headers"] == {"X-RPC-Auth-Session": "s1"}
+
+
+class _GatewayTimeoutHandler(http.server.BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_POST(self):
+        type(self).hits += 1
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(504)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def gateway_timeout_url():
+    _GatewayTimeoutHandler.hits = 0
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _GatewayTimeoutHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_writes_are_not_retried_on_status(gateway_timeout_url):
+    with Idoit(gateway_timeout_url, "key", retries=2) as c:
+        with pytest.raises(IdoitRequestError):
+            c.object_create("C__OBJTYPE__SERVER", "t")
+    assert _GatewayTimeoutHandler.hits == 1
+
+
+def test_reads_are_retried_on_status(gateway_timeout_url):
+    with Idoit(gateway_timeout_url, "key", retries=2) as c:
+        with pytest.raises(IdoitRequestError):
+            c.object_read(1)
+    assert _GatewayTimeoutHandler.hits == 3
+
+
+def test_read_overlapping_write_is_not_cached(client):
+    state = {"title": "old"}
+    read_started = threading.Event()
+    release_read = threading.Event()
+
+    def post(url, headers=None, data=None):
+        body = orjson.loads(data)
+        if body["method"] == "cmdb.object.update":
+            state["title"] = body["params"]["title"]
+            return _response({"jsonrpc": "2.0", "result": {"success": True}, "id": body["id"]})
+        result = {"title": state["title"]}
+        if not read_started.is_set():
+            read_started.set()
+            release_read.wait(5)
+        return _response({"jsonrpc": "2.0", "result": result, "id": body["id"]})
+
+    client._session.post.side_effect = post
+    reader = threading.Thread(target=client.object_read, args=(1,))
+    reader.start()
+    assert read_started.wait(5)
+    client.object_update(1, "new")
+    release_read.set()
+    reader.join(5)
+
+    assert client.object_read(1) == {"title": "new"}
+
+
+def test_cache_is_per_user(client):
+    client._session.post.return_value = _response({"jsonrpc": "2.0", "result": {"id": 1}, "id": 1})
+    client.username, client.password = "u1", "p1"
+    client.object_read(1)
+    client.username, client.password = "u2", "p2"
+    client.object_read(1)
+    assert client._session.post.call_count == 2
+
+
+def test_cache_disabled(client):
+    client.cache_size = 0
+    client._session.post.return_value = _response({"jsonrpc": "2.0", "result": {"id": 1}, "id": 1})
+    client.object_read(1)
+    client.object_read(1)
+    assert client._session.post.call_count == 2
+
+
+def test_http_error_carries_status(client):
+    client._session.post.return_value = _response(None, status_code=503, reason="Service Unavailable")
+    with pytest.raises(IdoitRequestError) as excinfo:
+        client.object_update(1, "t")
+    assert excinfo.value.code == 503
+    assert excinfo.value.msg == "Service Unavailable"
+    assert str(excinfo.value) == "code: 503, msg: Service Unavailable, data: None"
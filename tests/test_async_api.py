@@ -0,0 +1,67 @@
+import asyncio
+
+import orjson
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from pydoit.api import IdoitRequestError
+from pydoit.async_api import AsyncIdoit
+
+
+class _Response:
+    def __init__(self, payload, status=200, reason="OK"):
+        self.status = status
+        self.reason = reason
+        self._content = orjson.dumps(payload)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+    async def read(self):
+        return self._content
+
+
+class _Session:
+    def __init__(self):
+        self.bodies = []
+
+    def post(self, url, headers=None, data=None):
+        body = orjson.loads(data)
+        self.bodies.append(body)
+        return _Response({"jsonrpc": "2.0", "result": body["params"]["id"], "id": body["id"]})
+
+    async def close(self):
+        pass
+
+
+def test_connector_limit_follows_max_tasks():
+    async def run():
+        client = AsyncIdoit("http://idoit.test/src/jsonrpc.php", "key", max_tasks=7)
+        session = client._get_session()
+        limit = session.connector.limit
+        await client.close()
+        return limit
+
+    assert asyncio.run(run()) == 7
+
+
+def test_gather_keeps_order():
+    client = AsyncIdoit("http://idoit.test/src/jsonrpc.php", "key", max_tasks=2)
+    client._session = _Session()
+    calls = [("cmdb.object.read", {"id": i}) for i in range(10)]
+
+    assert asyncio.run(client.gather(calls)) == list(range(10))
+    assert "apikey" not in calls[0][1] # caller params are not mutated
+
+
+def test_http_error():
+    client = AsyncIdoit("http://idoit.test/src/jsonrpc.php", "key")
+    client._session = _Session()
+    client._session.post = lambda url, headers=None, data=None: _Response(None, status=503, reason="Service Unavailable")
+
+    with pytest.raises(IdoitRequestError):
+        asyncio.run(client.version())